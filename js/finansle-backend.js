@@ -214,9 +214,24 @@ class FinansleGame {
   normalizeDailyJson(raw) {
     const isFlat = !!raw.chart_data || !!raw.company_name || !!raw.ticker;
     const stock = isFlat ? raw : (raw.stock || {});
+    stock.chart_data = this.expandChartColumns(stock.chart_data);
     return { stock };
   }
 
+  // chart_data is stored column-wise ({dates, prices, highs, lows, volumes});
+  // expand it to point objects for the chart code. Older array-shaped files pass through.
+  expandChartColumns(chart) {
+    if (!chart || Array.isArray(chart)) return chart;
+    const { dates = [], prices = [], highs = [], lows = [], volumes = [] } = chart;
+    return dates.map((date, i) => ({
+      date,
+      price: prices[i],
+      high: highs[i],
+      low: lows[i],
+      volume: volumes[i],
+    }));
+  }
+
   applyDerivedMetrics(stock) {
     const data = stock.chart_data;
     if (!data || data.length < 2) return;
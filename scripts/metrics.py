@@ -3,15 +3,29 @@
 Explore available financial metrics in yfinance for Norwegian stocks
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 import yfinance as yf
 import pandas as pd
 
-def explore_stock_metrics(ticker_symbol):
+def prefetch_ticker(ticker_symbol):
+    """Create a Ticker and warm its cached info and financials"""
+    stock = yf.Ticker(ticker_symbol)
+    try:
+        stock.info
+        stock.financials
+    except Exception:
+        # Errors resurface (and get reported) when the ticker is explored
+        pass
+    return stock
+
+def explore_stock_metrics(ticker_symbol, stock=None):
     """Explore available metrics for a given stock"""
     print(f"\n=== Exploring {ticker_symbol} ===")
     
     try:
-        stock = yf.Ticker(ticker_symbol)
+        if stock is None:
+            stock = yf.Ticker(ticker_symbol)
         info = stock.info
         
         # Target metrics we want
@@ -103,9 +117,13 @@ def main():
         'NHY.OL'    # Norsk Hydro
     ]
     
+    # Fetch all tickers concurrently, then print each report in order
+    with ThreadPoolExecutor(max_workers=len(test_tickers)) as executor:
+        stocks = dict(zip(test_tickers, executor.map(prefetch_ticker, test_tickers)))
+    
     results = {}
     for ticker in test_tickers:
-        available_count = explore_stock_metrics(ticker)
+        available_count = explore_stock_metrics(ticker, stocks[ticker])
         results[ticker] = available_count
     
     print(f"\n=== SUMMARY ===")
@@ -5,18 +5,28 @@ Fixed version with proper timezone handling and error reporting
 
 import json
 import logging
+import math
 import os
 import random
 import time
 import requests
 import sys
+import zlib
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from functools import cached_property
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 
-import yfinance as yf
+import numpy as np
 import pandas as pd
 
+try:
+    import orjson
+except ImportError:  # optional, falls back to stdlib json
+    orjson = None
+
 # ---------- logging ----------
 logging.basicConfig(
     level=logging.INFO,
@@ -34,10 +44,30 @@ REPO_ROOT = SCRIPT_DIR.parent
 DATA_DIR = REPO_ROOT / "data"
 OBX_PATH = DATA_DIR / "obx.json"
 DAILY_PATH = DATA_DIR / "daily.json"
+# Disposable info cache; it only speeds up local re-runs (CI starts without .cache/ every run)
+CACHE_DIR = REPO_ROOT / ".cache" / "yfinance"
+
+INFO_CACHE_TTL = timedelta(hours=24)
 
 EODHD_API_TOKEN = os.environ.get("EODHD_API_TOKEN", "")
+
+# Shared keep-alive session for our own HTTP calls (yfinance pools its own)
+HTTP_SESSION = requests.Session()
 STOCK_LIST_REFRESH_DAYS = 7
 
+# Reasonableness bounds checked by ValuationExtractor._validate_metrics
+_RULE_KEYS = (
+    'trailing_pe',     # Allow negative P/E for companies with losses
+    'forward_pe',
+    'peg_ratio',
+    'price_to_book',
+    'price_to_sales',
+    'ev_revenue',
+    'ev_ebitda',       # Allow negative EV/EBITDA
+)
+_RULE_LO = np.array([-1000, 0, 0, 0, 0, 0, -100], dtype=np.float64)
+_RULE_HI = np.array([1000, 1000, 10, 100, 200, 500, 1000], dtype=np.float64)
+
 def ensure_data_dir():
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     log.info(f"Data directory ensured at: {DATA_DIR}")
@@ -53,8 +83,7 @@ def refresh_obx_list() -> bool:
     # Check if refresh is needed
     if OBX_PATH.exists():
         try:
-            with OBX_PATH.open("r", encoding="utf-8") as f:
-                existing = json.load(f)
+            existing = load_json(OBX_PATH)
             extracted = existing.get("metadata", {}).get("extracted_date", "")
             if extracted:
                 last_update = datetime.fromisoformat(extracted)
@@ -71,7 +100,7 @@ def refresh_obx_list() -> bool:
 
     log.info("Refreshing Oslo Børs stock list from EODHD...")
     url = f"https://eodhd.com/api/exchange-symbol-list/OL?api_token={EODHD_API_TOKEN}&fmt=json"
-    resp = requests.get(url, timeout=30)
+    resp = HTTP_SESSION.get(url, timeout=30)
     resp.raise_for_status()
     raw_stocks = resp.json()
 
@@ -95,14 +124,31 @@ def refresh_obx_list() -> bool:
         "stocks": stocks,
     }
 
-    tmp_path = OBX_PATH.with_suffix(".json.tmp")
-    with tmp_path.open("w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
-    tmp_path.replace(OBX_PATH)
+    write_json_atomic(OBX_PATH, payload)
 
     log.info(f"✅ Updated obx.json with {len(stocks)} common stocks from EODHD")
     return True
 
+def load_cached_info(ticker_symbol: str) -> Optional[Dict[str, Any]]:
+    """Return the cached yfinance info dict for ticker_symbol if younger than INFO_CACHE_TTL"""
+    path = CACHE_DIR / f"{ticker_symbol}.info.json"
+    try:
+        age = time.time() - path.stat().st_mtime
+        if age > INFO_CACHE_TTL.total_seconds():
+            return None
+        return load_json(path)
+    except (OSError, ValueError):
+        return None
+
+def store_cached_info(ticker_symbol: str, info: Dict[str, Any]) -> None:
+    """Persist a yfinance info dict so re-runs within INFO_CACHE_TTL skip the request"""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Plain compact write, no fsync: a torn entry fails to parse and is simply refetched
+        (CACHE_DIR / f"{ticker_symbol}.info.json").write_bytes(dump_json(info, indent=False))
+    except Exception as e:
+        log.debug(f"Could not cache info for {ticker_symbol}: {e}")
+
 def get_oslo_date() -> str:
     """Get current date in Oslo timezone (UTC+1/UTC+2)"""
     # Oslo is UTC+1 (CET) or UTC+2 (CEST) depending on DST
@@ -147,6 +193,7 @@ class CurrencyHandler:
         
         # Method 1: yfinance
         try:
+            import yfinance as yf
             usd_nok = yf.Ticker("USDNOK=X")
             info = usd_nok.info
             rate = info.get('regularMarketPrice') or info.get('ask') or info.get('bid')
@@ -158,7 +205,7 @@ class CurrencyHandler:
         
         # Method 2: Norges Bank API
         try:
-            response = requests.get(
+            response = HTTP_SESSION.get(
                 "https://data.norges-bank.no/api/data/EXR/B.USD.NOK.SP?format=json&lastNObservations=1",
                 timeout=5
             )
@@ -173,7 +220,7 @@ class CurrencyHandler:
         
         # Method 3: Free currency API
         try:
-            response = requests.get(
+            response = HTTP_SESSION.get(
                 "https://api.exchangerate-api.com/v4/latest/USD",
                 timeout=5
             )
@@ -260,24 +307,57 @@ class CurrencyHandler:
         
         return normalized_data
 
+# Shared across extractors so the USD/NOK rate is fetched once per cache window, not per ticker
+CURRENCY_HANDLER = CurrencyHandler()
+
+# Lower bounds for each NOK unit, in ascending order, paired with _NOK_UNITS
+_NOK_THRESHOLDS = (1e6, 1e9, 1e12)
+_NOK_UNITS = ((1e6, "mill"), (1e9, "mrd"), (1e12, "bill"))
+
+def format_nok_amount(value: float, small_in_millions: bool = False) -> str:
+    """Format a non-zero NOK amount as bill/mrd/mill NOK
+    
+    Amounts below one million are shown in millions when small_in_millions is
+    set, otherwise as whole kroner.
+    """
+    idx = bisect_right(_NOK_THRESHOLDS, abs(value))
+    if idx == 0:
+        if not small_in_millions:
+            return f"{value:,.0f} NOK"
+        idx = 1
+    divisor, unit = _NOK_UNITS[idx - 1]
+    return f"{value/divisor:.1f} {unit} NOK"
+
 class ValuationExtractor:
     """Robust valuation metrics extractor with comprehensive error handling"""
     
     def __init__(self, ticker_symbol: str):
+        import yfinance as yf
         self.ticker_symbol = ticker_symbol
         self.ticker = yf.Ticker(ticker_symbol)
-        self.info = {}
         self.data_quality_issues = []
-        self.currency_handler = CurrencyHandler()
+        self.currency_handler = CURRENCY_HANDLER
+    
+    @cached_property
+    def info(self) -> Dict[str, Any]:
+        """yfinance info dict, fetched once per extractor and cached on disk"""
+        cached = load_cached_info(self.ticker_symbol)
+        if cached is not None:
+            log.debug(f"Using cached info for {self.ticker_symbol}")
+            return cached
         
-    def get_comprehensive_metrics(self) -> Dict[str, Any]:
-        """Extract all valuation metrics with validation and currency conversion"""
         try:
-            self.info = self.ticker.info or {}
+            info = self.ticker.info or {}
         except Exception as e:
             log.warning(f"Failed to get ticker info for {self.ticker_symbol}: {e}")
-            self.info = {}
-            
+            return {}
+        
+        if info:
+            store_cached_info(self.ticker_symbol, info)
+        return info
+        
+    def get_comprehensive_metrics(self) -> Dict[str, Any]:
+        """Extract all valuation metrics with validation and currency conversion"""
         if not self.info:
             log.error(f"No info data available for {self.ticker_symbol}")
             return self._get_fallback_metrics()
@@ -291,20 +371,32 @@ class ValuationExtractor:
         target_mean = self._safe_extract('targetMeanPrice')
         target_high = self._safe_extract('targetHighPrice')
         target_low = self._safe_extract('targetLowPrice')
+        
+        # Derived metrics are computed once; each call may log and record quality issues
+        market_cap = self._safe_extract('marketCap')
+        enterprise_value = self._calculate_enterprise_value()
+        trailing_pe = self._get_trailing_pe()
+        forward_pe = self._safe_extract('forwardPE')
+        peg_ratio = self._safe_extract('pegRatio')
+        price_to_book = self._safe_extract('priceToBook')
+        price_to_sales = self._get_price_to_sales_with_ttm(normalized_financial_data)
+        ev_revenue = self._safe_extract('enterpriseToRevenue')
+        ev_ebitda = self._get_ev_ebitda_with_ttm(normalized_financial_data, enterprise_value)
+        net_income = self._safe_extract('netIncomeToCommon')
 
         metrics = {
             'ticker': self.ticker_symbol,
-            'market_cap': self._safe_extract('marketCap'),
-            'market_cap_formatted': self._format_market_cap(self._safe_extract('marketCap')),
-            'enterprise_value': self._calculate_enterprise_value(),
-            'enterprise_value_formatted': self._format_market_cap(self._calculate_enterprise_value()),
-            'trailing_pe': self._get_trailing_pe(),
-            'forward_pe': self._safe_extract('forwardPE'),
-            'peg_ratio': self._safe_extract('pegRatio'),
-            'price_to_book': self._safe_extract('priceToBook'),
-            'price_to_sales': self._get_price_to_sales_with_ttm(normalized_financial_data),
-            'ev_revenue': self._safe_extract('enterpriseToRevenue'),
-            'ev_ebitda': self._get_ev_ebitda_with_ttm(normalized_financial_data),
+            'market_cap': market_cap,
+            'market_cap_formatted': self._format_market_cap(market_cap),
+            'enterprise_value': enterprise_value,
+            'enterprise_value_formatted': self._format_market_cap(enterprise_value),
+            'trailing_pe': trailing_pe,
+            'forward_pe': forward_pe,
+            'peg_ratio': peg_ratio,
+            'price_to_book': price_to_book,
+            'price_to_sales': price_to_sales,
+            'ev_revenue': ev_revenue,
+            'ev_ebitda': ev_ebitda,
             'total_revenue': normalized_financial_data.get('total_revenue_ttm'),
             'revenue_formatted': self._format_revenue(normalized_financial_data.get('total_revenue_ttm')),
             'revenue_latest': normalized_financial_data.get('total_revenue_latest'),
@@ -316,17 +408,17 @@ class ValuationExtractor:
             'ebitda_timestamp': normalized_financial_data.get('data_timestamp'),
             'financial_currency_detected': normalized_financial_data.get('financial_currency_detected'),
             'currency_conversion_applied': normalized_financial_data.get('currency_conversion_applied'),
-            'net_income': self._safe_extract('netIncomeToCommon'),
-            'net_income_formatted': self._format_revenue(self._safe_extract('netIncomeToCommon')),
+            'net_income': net_income,
+            'net_income_formatted': self._format_revenue(net_income),
             'total_cash': self._safe_extract('totalCash'),
             'total_debt': self._safe_extract('totalDebt'),
-            'ev_ebitda_formatted': self._format_ratio(self._get_ev_ebitda_with_ttm(normalized_financial_data)),
-            'price_to_sales_formatted': self._format_ratio(self._get_price_to_sales_with_ttm(normalized_financial_data)),
-            'trailing_pe_formatted': self._format_ratio(self._get_trailing_pe()),
-            'forward_pe_formatted': self._format_ratio(self._safe_extract('forwardPE')),
-            'peg_ratio_formatted': self._format_ratio(self._safe_extract('pegRatio')),
-            'price_to_book_formatted': self._format_ratio(self._safe_extract('priceToBook')),
-            'ev_revenue_formatted': self._format_ratio(self._safe_extract('enterpriseToRevenue')),
+            'ev_ebitda_formatted': self._format_ratio(ev_ebitda),
+            'price_to_sales_formatted': self._format_ratio(price_to_sales),
+            'trailing_pe_formatted': self._format_ratio(trailing_pe),
+            'forward_pe_formatted': self._format_ratio(forward_pe),
+            'peg_ratio_formatted': self._format_ratio(peg_ratio),
+            'price_to_book_formatted': self._format_ratio(price_to_book),
+            'ev_revenue_formatted': self._format_ratio(ev_revenue),
             'target_mean': target_mean,
             'target_high': target_high,
             'target_low': target_low,
@@ -468,9 +560,8 @@ class ValuationExtractor:
         
         return result
     
-    def _get_ev_ebitda_with_ttm(self, normalized_data: Dict) -> Optional[float]:
+    def _get_ev_ebitda_with_ttm(self, normalized_data: Dict, enterprise_value: Optional[float]) -> Optional[float]:
         """Calculate EV/EBITDA using proper TTM EBITDA"""
-        enterprise_value = self._calculate_enterprise_value()
         ebitda_ttm = normalized_data.get('ebitda_ttm')
         
         if enterprise_value and ebitda_ttm and ebitda_ttm > 0:
@@ -564,9 +655,9 @@ class ValuationExtractor:
     def _calculate_enterprise_value(self) -> Optional[float]:
         """Calculate Enterprise Value with validation"""
         ev = self._safe_extract('enterpriseValue')
+        market_cap = self._safe_extract('marketCap')
         
         if ev is not None:
-            market_cap = self._safe_extract('marketCap')
             if market_cap and ev > market_cap * 10:
                 self.data_quality_issues.append(f"Enterprise Value seems too high: {ev:,.0f} vs Market Cap: {market_cap:,.0f}")
             elif market_cap and ev < market_cap * 0.5:
@@ -574,7 +665,6 @@ class ValuationExtractor:
             else:
                 return ev
         
-        market_cap = self._safe_extract('marketCap')
         total_debt = self._safe_extract('totalDebt') or 0
         total_cash = self._safe_extract('totalCash') or 0
         
@@ -592,47 +682,26 @@ class ValuationExtractor:
     
     def _validate_metrics(self, metrics: Dict[str, Any]) -> None:
         """Validate extracted metrics for reasonableness"""
-        validation_rules = {
-            'trailing_pe': (-1000, 1000),  # Allow negative P/E for companies with losses
-            'forward_pe': (0, 1000),
-            'peg_ratio': (0, 10),
-            'price_to_book': (0, 100),
-            'price_to_sales': (0, 200),
-            'ev_revenue': (0, 500),
-            'ev_ebitda': (-100, 1000)  # Allow negative EV/EBITDA
-        }
-        
-        for metric, (min_val, max_val) in validation_rules.items():
-            value = metrics.get(metric)
-            if value is not None and (value < min_val or value > max_val):
-                self.data_quality_issues.append(f"{metric} outside normal range: {value}")
+        values = np.array(
+            [np.nan if metrics.get(key) is None else metrics[key] for key in _RULE_KEYS],
+            dtype=np.float64,
+        )
+        # NaN (missing metric) compares False on both sides and is never flagged
+        out_of_range = (values < _RULE_LO) | (values > _RULE_HI)
+        for i in np.flatnonzero(out_of_range):
+            self.data_quality_issues.append(f"{_RULE_KEYS[i]} outside normal range: {metrics[_RULE_KEYS[i]]}")
     
     def _format_market_cap(self, value: Optional[float]) -> str:
         """Format market cap in NOK"""
         if value is None or value <= 0:
             return "Ikke tilgjengelig"
-            
-        if value >= 1e12:
-            return f"{value/1e12:.1f} bill NOK"
-        elif value >= 1e9:
-            return f"{value/1e9:.1f} mrd NOK"
-        else:
-            return f"{value/1e6:.1f} mill NOK"
+        return format_nok_amount(value, small_in_millions=True)
     
     def _format_revenue(self, value: Optional[float]) -> str:
         """Format revenue in NOK"""
         if value is None or value == 0:
             return "Ikke tilgjengelig"
-        
-        abs_val = abs(value)
-        if abs_val >= 1e12:
-            return f"{value/1e12:.1f} bill NOK"
-        elif abs_val >= 1e9:
-            return f"{value/1e9:.1f} mrd NOK"
-        elif abs_val >= 1e6:
-            return f"{value/1e6:.1f} mill NOK"
-        else:
-            return f"{value:,.0f} NOK"
+        return format_nok_amount(value, small_in_millions=False)
     
     def _format_ratio(self, value: Optional[float]) -> str:
         """Format financial ratios (shows '-' for negative or missing data)"""
@@ -656,10 +725,10 @@ def normalize_ticker(ticker: str) -> str:
     if not ticker:
         return ""
     t = ticker.strip().upper()
-    return t if t.endswith(".OL") else f"{t}.OL"
+    return sys.intern(t if t[-3:] == ".OL" else f"{t}.OL")
 
 def retry(func, attempts=3, delay=1.0, factor=1.5, what="operation"):
-    """Retry function with exponential backoff"""
+    """Retry function with exponential backoff plus up to 30% random jitter"""
     last_exc = None
     for attempt in range(attempts):
         try:
@@ -667,15 +736,21 @@ def retry(func, attempts=3, delay=1.0, factor=1.5, what="operation"):
         except Exception as exc:
             last_exc = exc
             if attempt < attempts - 1:
-                wait_time = delay * (factor ** attempt)
+                # Jitter keeps concurrent failures from retrying in lockstep
+                wait_time = delay * (factor ** attempt) * (1 + random.random() * 0.3)
                 log.warning(f"{what} failed (attempt {attempt + 1}/{attempts}): {exc}. Retrying in {wait_time:.1f}s...")
                 time.sleep(wait_time)
             else:
                 log.error(f"{what} failed after {attempts} attempts: {exc}")
     raise last_exc
 
-def get_current_price(ticker_symbol: str) -> Optional[float]:
-    """Get current stock price with multiple fallback methods"""
+def get_current_price(ticker_symbol: str, hist: Optional[pd.DataFrame] = None) -> Optional[float]:
+    """Get current stock price with multiple fallback methods
+    
+    When hist (already downloaded daily history) is given, its last close is
+    used as the fallback instead of requesting recent history again.
+    """
+    import yfinance as yf
     stock = yf.Ticker(ticker_symbol)
     
     try:
@@ -688,9 +763,10 @@ def get_current_price(ticker_symbol: str) -> Optional[float]:
         log.debug(f"fast_info failed for {ticker_symbol}: {e}")
     
     try:
-        hist = stock.history(period="5d", interval="1d", auto_adjust=False)
-        if not hist.empty and "Close" in hist.columns:
-            price = float(hist["Close"].iloc[-1])
+        recent = hist if hist is not None else stock.history(period="5d", interval="1d", auto_adjust=False)
+        if not recent.empty and "Close" in recent.columns:
+            closes = recent["Close"].dropna()
+            price = float(closes.iloc[-1]) if not closes.empty else 0.0
             if price > 0:
                 return price
     except Exception as e:
@@ -707,129 +783,152 @@ def get_current_price(ticker_symbol: str) -> Optional[float]:
     log.warning(f"Could not determine current price for {ticker_symbol}")
     return None
 
-def get_historical_chart_data(ticker: str, period: str = "5y") -> List[Dict]:
-    """Get historical price data with robust error handling"""
+def fetch_price_history(ticker: str, period: str = "5y") -> Optional[pd.DataFrame]:
+    """Download daily price history with retries, or None if unavailable"""
     ticker_norm = normalize_ticker(ticker)
     
     def _pull():
+        import yfinance as yf
         return yf.Ticker(ticker_norm).history(period=period, interval="1d", auto_adjust=False)
     
     try:
         hist: pd.DataFrame = retry(_pull, attempts=3, delay=1.0, factor=1.5, what=f"history({ticker_norm})")
     except Exception as e:
         log.error(f"Failed to get historical data for {ticker_norm}: {e}")
-        return []
+        return None
     
     if hist is None or hist.empty:
         log.warning(f"No historical data for {ticker_norm}")
-        return []
+        return None
+    
+    return hist
+
+def get_historical_chart_data(ticker: str, period: str = "5y", hist: Optional[pd.DataFrame] = None) -> Dict[str, List]:
+    """Get historical price data with robust error handling
+    
+    The chart is columnar: parallel "dates", "prices", "highs", "lows" and
+    "volumes" lists (empty dict when no data). Pass hist to build the chart
+    from an already downloaded history frame.
+    """
+    ticker_norm = normalize_ticker(ticker)
+    
+    if hist is None:
+        hist = fetch_price_history(ticker_norm, period)
+        if hist is None:
+            return {}
     
     hist = hist.dropna(subset=["Close"])
     if hist.empty:
         log.warning(f"No 'Close' data for {ticker_norm}")
-        return []
+        return {}
+    
+    # Sort and thin long histories on the frame, before any Python values exist
+    hist = hist.sort_index(kind="stable")
+    if len(hist) > 800:
+        hist = hist.iloc[::2]
+    
+    # Missing High/Low fall back to Close, missing Volume to 0
+    close = hist["Close"]
+    highs = hist["High"].fillna(close) if "High" in hist.columns else close
+    lows = hist["Low"].fillna(close) if "Low" in hist.columns else close
+    volumes = (hist["Volume"].fillna(0).to_numpy(dtype=np.int64) if "Volume" in hist.columns
+               else np.zeros(len(hist), dtype=np.int64))
+    
+    def _rounded(series: pd.Series) -> List[float]:
+        return [round(v, 2) for v in series.to_numpy(dtype=np.float64).tolist()]
+    
+    chart = {
+        "dates": hist.index.strftime("%Y-%m-%d").tolist(),
+        "prices": _rounded(close),
+        "highs": _rounded(highs),
+        "lows": _rounded(lows),
+        "volumes": volumes.tolist(),
+    }
     
-    out: List[Dict] = []
-    for date, row in hist.iterrows():
-        try:
-            out.append({
-                "date": pd.Timestamp(date).strftime("%Y-%m-%d"),
-                "price": round(float(row["Close"]), 2),
-                "high": round(float(row.get("High", row["Close"])), 2),
-                "low": round(float(row.get("Low", row["Close"])), 2),
-                "volume": int(row.get("Volume", 0) or 0),
-            })
-        except Exception as e:
-            log.debug(f"Error processing row for {date}: {e}")
-            continue
+    return smooth_price_anomalies(chart)
+
+def smooth_price_anomalies(chart: Dict[str, List], threshold_multiplier: float = 3.0) -> Dict[str, List]:
+    """Detect and smooth price anomalies; rolling medians are taken from the raw prices"""
+    n = len(chart.get("prices", []))
+    if n < 10:
+        return chart
     
-    out.sort(key=lambda x: x["date"])
+    window_size = min(10, n // 4)
+    half = window_size // 2
     
-    if len(out) > 800:
-        out = out[::2]
+    # Centered rolling median; min_periods=1 truncates the window at both ends
+    prices = np.array(chart["prices"], dtype=np.float64)
+    medians = pd.Series(prices).rolling(2 * half + 1, center=True, min_periods=1).median().to_numpy()
     
-    out = smooth_price_anomalies(out)
+    anomalies = (prices > medians * threshold_multiplier) | (prices < medians / threshold_multiplier)
     
-    return out
-
-def smooth_price_anomalies(chart_data: List[Dict], threshold_multiplier: float = 3.0) -> List[Dict]:
-    """Detect and smooth price anomalies using rolling median"""
-    if len(chart_data) < 10:
-        return chart_data
+    flagged = np.flatnonzero(anomalies)
+    if not flagged.size:
+        return chart
     
-    smoothed_data = [pt.copy() for pt in chart_data]
-    window_size = min(10, len(chart_data) // 4)
+    # Copy only the columns that get patched; the input chart is left untouched
+    smoothed = {**chart, "prices": list(chart["prices"]), "highs": list(chart["highs"]), "lows": list(chart["lows"])}
+    new_prices, highs, lows = smoothed["prices"], smoothed["highs"], smoothed["lows"]
     
-    for i in range(len(smoothed_data)):
-        start_idx = max(0, i - window_size // 2)
-        end_idx = min(len(smoothed_data), i + window_size // 2 + 1)
-        
-        window_prices = [smoothed_data[j]["price"] for j in range(start_idx, end_idx)]
-        window_prices.sort()
+    for i in flagged:
+        current_price = new_prices[i]
+        median = float(medians[i])
+        log.warning(f"Detected price anomaly at {chart['dates'][i]}: {current_price} NOK (median: {median:.2f} NOK)")
         
-        n = len(window_prices)
-        median = window_prices[n // 2] if n % 2 == 1 else (window_prices[n // 2 - 1] + window_prices[n // 2]) / 2
+        if i == 0 or i == n - 1:
+            new_prices[i] = round(median, 2)
+        else:
+            interpolated = (new_prices[i-1] + new_prices[i+1]) / 2
+            new_prices[i] = round(interpolated, 2)
         
-        current_price = smoothed_data[i]["price"]
+        new_price = new_prices[i]
+        highs[i] = round(max(new_price * 1.02, highs[i]), 2)
+        lows[i] = round(min(new_price * 0.98, lows[i]), 2)
         
-        if current_price > median * threshold_multiplier or current_price < median / threshold_multiplier:
-            log.warning(f"Detected price anomaly at {smoothed_data[i]['date']}: {current_price} NOK (median: {median:.2f} NOK)")
-            
-            if i == 0:
-                smoothed_data[i]["price"] = round(median, 2)
-            elif i == len(smoothed_data) - 1:
-                smoothed_data[i]["price"] = round(median, 2)
-            else:
-                prev_price = smoothed_data[i-1]["price"]
-                next_price = smoothed_data[i+1]["price"]
-                interpolated = (prev_price + next_price) / 2
-                smoothed_data[i]["price"] = round(interpolated, 2)
-            
-            new_price = smoothed_data[i]["price"]
-            smoothed_data[i]["high"] = round(max(new_price * 1.02, smoothed_data[i].get("high", new_price)), 2)
-            smoothed_data[i]["low"] = round(min(new_price * 0.98, smoothed_data[i].get("low", new_price)), 2)
-            
-            log.info(f"Smoothed anomaly: {current_price} → {new_price} NOK")
+        log.info(f"Smoothed anomaly: {current_price} → {new_price} NOK")
     
-    return smoothed_data
+    return smoothed
 
-def calculate_performance_metrics(chart: List[Dict]) -> Dict[str, float]:
-    """Calculate performance metrics from chart data"""
-    if len(chart) < 2:
+def minus_years(iso_date: str, years: int) -> str:
+    """Shift a YYYY-MM-DD string back by whole years without parsing it
+    
+    Feb 29 becomes e.g. 2023-02-29, which is not a real date but still sorts
+    between Feb 28 and Mar 1, so on-or-after comparisons stay correct.
+    """
+    return f"{int(iso_date[:4]) - years:04d}{iso_date[4:]}"
+
+def calculate_performance_metrics(chart: Dict[str, List]) -> Dict[str, float]:
+    """Calculate performance metrics from columnar chart data"""
+    dates = chart.get("dates", [])
+    prices = chart.get("prices", [])
+    if len(prices) < 2:
         return {"performance_5y": 0.0, "performance_2y": 0.0, "performance_1y": 0.0, "volatility": 0.0}
     
     def pct_change(old_price, new_price):
         return 0.0 if old_price <= 0 else (new_price - old_price) / old_price * 100.0
     
-    first_price = chart[0]["price"]
-    last_price = chart[-1]["price"]
+    first_price = prices[0]
+    last_price = prices[-1]
     
-    end_date = datetime.strptime(chart[-1]["date"], "%Y-%m-%d")
-    two_years_ago = end_date.replace(year=end_date.year - 2).strftime("%Y-%m-%d")
-    one_year_ago = end_date.replace(year=end_date.year - 1).strftime("%Y-%m-%d")
+    end_date = dates[-1]
+    two_years_ago = minus_years(end_date, 2)
+    one_year_ago = minus_years(end_date, 1)
     
+    # Dates are sorted ISO strings, so lexicographic order is chronological
     def find_price_on_or_after(target_date):
-        for point in chart:
-            if point["date"] >= target_date:
-                return point["price"]
-        return chart[0]["price"]
+        idx = bisect_left(dates, target_date)
+        return prices[idx] if idx < len(prices) else prices[0]
     
     price_2y_ago = find_price_on_or_after(two_years_ago)
     price_1y_ago = find_price_on_or_after(one_year_ago)
     
-    sample = chart[-252:] if len(chart) >= 252 else chart
-    returns = []
-    for i in range(1, len(sample)):
-        prev_price = sample[i-1]["price"]
-        curr_price = sample[i]["price"]
-        if prev_price > 0:
-            returns.append((curr_price - prev_price) / prev_price)
+    sample_prices = np.array(prices[-252:], dtype=np.float64)
+    prev_prices = sample_prices[:-1]
+    valid = prev_prices > 0
+    returns = np.diff(sample_prices)[valid] / prev_prices[valid]
     
-    volatility = 0.0
-    if returns:
-        avg_return = sum(returns) / len(returns)
-        variance = sum((r - avg_return) ** 2 for r in returns) / len(returns)
-        volatility = (variance ** 0.5) * (252 ** 0.5) * 100.0
+    # Population std (ddof=0) of daily returns, annualized
+    volatility = float(returns.std() * np.sqrt(252) * 100.0) if returns.size else 0.0
     
     return {
         "performance_5y": round(pct_change(first_price, last_price), 2),
@@ -844,14 +943,22 @@ def fetch_enhanced_stock_data(ticker: str) -> Optional[Dict]:
     log.info(f"Fetching enhanced data for {ticker_norm}")
     
     extractor = ValuationExtractor(ticker_norm)
-    valuation_metrics = extractor.get_comprehensive_metrics()
     
-    current_price = get_current_price(ticker_norm)
+    # Valuation (info + financials) and the 5y history are independent network
+    # calls, so run them concurrently. The history feeds both the chart and the
+    # current-price fallback.
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        metrics_future = pool.submit(extractor.get_comprehensive_metrics)
+        hist_future = pool.submit(fetch_price_history, ticker_norm, "5y")
+        hist = hist_future.result()
+        valuation_metrics = metrics_future.result()
+    
+    current_price = get_current_price(ticker_norm, hist)
     if current_price is None:
         log.error(f"Could not determine current price for {ticker_norm}")
         return None
     
-    chart = get_historical_chart_data(ticker_norm, period="5y")
+    chart = get_historical_chart_data(ticker_norm, period="5y", hist=hist) if hist is not None else {}
     if not chart:
         log.error(f"Could not get chart data for {ticker_norm}")
         return None
@@ -863,12 +970,12 @@ def fetch_enhanced_stock_data(ticker: str) -> Optional[Dict]:
     week_52_low = info.get("fiftyTwoWeekLow")
     
     if (week_52_high is None or week_52_low is None) and chart:
-        end_date = datetime.strptime(chart[-1]["date"], "%Y-%m-%d")
-        one_year_ago = end_date.replace(year=end_date.year - 1).strftime("%Y-%m-%d")
-        last_year_prices = [pt["price"] for pt in chart if pt["date"] >= one_year_ago]
-        if last_year_prices:
-            week_52_high = max(last_year_prices)
-            week_52_low = min(last_year_prices)
+        one_year_ago = minus_years(chart["dates"][-1], 1)
+        start = bisect_left(chart["dates"], one_year_ago)
+        last_year_prices = np.array(chart["prices"][start:], dtype=np.float64)
+        if last_year_prices.size:
+            week_52_high = float(last_year_prices.max())
+            week_52_low = float(last_year_prices.min())
     
     data = {
         "company_name": info.get("longName") or info.get("shortName") or ticker_norm,
@@ -888,7 +995,7 @@ def fetch_enhanced_stock_data(ticker: str) -> Optional[Dict]:
     }
     
     log.info(f"[SUCCESS] {data['company_name']}: price {data['current_price']} NOK, "
-             f"quality score {data['data_quality_score']}, {len(chart)} chart points")
+             f"quality score {data['data_quality_score']}, {len(chart['dates'])} chart points")
     
     if valuation_metrics['data_quality_issues']:
         log.warning(f"Data quality issues for {ticker_norm}: {valuation_metrics['data_quality_issues']}")
@@ -901,8 +1008,7 @@ def load_obx_list() -> List[Dict]:
     if not OBX_PATH.exists():
         raise FileNotFoundError(f"Missing {OBX_PATH}")
     
-    with OBX_PATH.open("r", encoding="utf-8") as f:
-        raw = json.load(f)
+    raw = load_json(OBX_PATH)
     
     if isinstance(raw, list):
         items = raw
@@ -924,13 +1030,13 @@ def load_obx_list() -> List[Dict]:
     log.info(f"Loaded {len(out)} stocks from obx.json")
     return out
 
-def select_daily_stock() -> Dict:
-    """Select daily stock deterministically based on Oslo date"""
+def select_daily_stock(today: Optional[str] = None) -> Dict:
+    """Select daily stock deterministically based on Oslo date (today, computed if not given)"""
     stocks = load_obx_list()
-    today = get_oslo_date()
+    today = today or get_oslo_date()
     
-    random.seed(today)
-    selected = random.choice(stocks)
+    # Stateless date hash so the pick never touches the global random state
+    selected = stocks[zlib.crc32(today.encode("utf-8")) % len(stocks)]
     
     log.info(f"[SELECTED] {today}: {selected['name']} ({selected['ticker']})")
     return selected
@@ -939,7 +1045,7 @@ def calculate_difficulty_rating(data: Dict) -> str:
     """Calculate game difficulty based on various factors"""
     score = 0
     
-    market_cap = data.get('market_cap', 0)
+    market_cap = data.get('market_cap') or 0  # None when Yahoo has no market cap
     if market_cap < 1e9:
         score += 3
     elif market_cap < 10e9:
@@ -975,33 +1081,20 @@ def calculate_difficulty_rating(data: Dict) -> str:
     else:
         return "Vanskelig"
 
+# (category, predicate) pairs in display order; a category is offered when its data is present
+_HINT_RULES = (
+    ("Sektor", lambda d: bool(d.get('sector')) and d['sector'] != 'Ukjent'),
+    ("Antall ansatte", lambda d: (d.get('employees') or 0) > 0),
+    ("Markedsverdi", lambda d: (d.get('market_cap') or 0) > 0),
+    ("P/E-tall", lambda d: bool(d.get('trailing_pe'))),
+    ("Hovedkontor", lambda d: bool(d.get('headquarters')) and d['headquarters'] != 'Norge'),
+    ("Aksjeutvikling", lambda d: any(d.get(key, 0) != 0 for key in ('performance_1y', 'performance_5y', 'volatility'))),
+    ("Forretningsområde", lambda d: bool(d.get('description')) and len(d['description']) > 50),
+)
+
 def get_hint_categories(data: Dict) -> List[str]:
     """Generate hint categories based on available data"""
-    categories = []
-    
-    if data.get('sector') and data['sector'] != 'Ukjent':
-        categories.append("Sektor")
-    
-    if data.get('employees', 0) > 0:
-        categories.append("Antall ansatte")
-    
-    if data.get('market_cap', 0) > 0:
-        categories.append("Markedsverdi")
-    
-    if data.get('trailing_pe'):
-        categories.append("P/E-tall")
-    
-    if data.get('headquarters') and data['headquarters'] != 'Norge':
-        categories.append("Hovedkontor")
-    
-    performance_hints = ['performance_1y', 'performance_5y', 'volatility']
-    if any(data.get(key, 0) != 0 for key in performance_hints):
-        categories.append("Aksjeutvikling")
-    
-    if data.get('description') and len(data['description']) > 50:
-        categories.append("Forretningsområde")
-    
-    return categories
+    return [category for category, available in _HINT_RULES if available(data)]
 
 def print_summary(data: Dict) -> None:
     """Print summary of the generated data"""
@@ -1020,7 +1113,7 @@ def print_summary(data: Dict) -> None:
     print(f"Revenue: {data.get('revenue_formatted', 'N/A')}")
     print(f"Data Quality Score: {data.get('data_quality_score', 0)}/1.0")
     print(f"Difficulty: {data.get('difficulty_rating', 'N/A')}")
-    print(f"Chart Points: {len(data.get('chart_data', []))}")
+    print(f"Chart Points: {len(data.get('chart_data', {}).get('dates', []))}")
     
     issues = data.get('data_quality_issues', [])
     if issues:
@@ -1030,15 +1123,14 @@ def print_summary(data: Dict) -> None:
         if len(issues) > 5:
             print(f"  ... and {len(issues) - 5} more issues")
 
-def check_if_data_changed(data: Dict) -> bool:
+def check_if_data_changed(data: Dict, today: Optional[str] = None) -> bool:
     """Check if new data is different from existing daily.json"""
     if not DAILY_PATH.exists():
         log.info("No existing daily.json found")
         return True
     
     try:
-        with DAILY_PATH.open("r", encoding="utf-8") as f:
-            existing_data = json.load(f)
+        existing_data = load_json(DAILY_PATH)
         
         existing_ticker = existing_data.get('ticker', '').upper()
         new_ticker = data.get('ticker', '').upper()
@@ -1048,7 +1140,7 @@ def check_if_data_changed(data: Dict) -> bool:
             return True
         
         existing_date = existing_data.get('last_updated', '')
-        today = get_oslo_date()
+        today = today or get_oslo_date()
         
         if existing_date.startswith(today):
             log.info(f"Data already updated today ({today}) for {existing_ticker}")
@@ -1062,22 +1154,86 @@ def check_if_data_changed(data: Dict) -> bool:
         return True
 
 def serialize_for_json(obj):
-    """Custom JSON serializer for objects not serializable by default"""
+    """Custom JSON serializer for objects not serializable by default
+    
+    Handles numpy values the same way orjson's OPT_SERIALIZE_NUMPY does, so
+    output does not depend on which encoder is installed.
+    """
     if isinstance(obj, pd.Timestamp):
         return obj.strftime("%Y-%m-%d")
     elif isinstance(obj, datetime):
         return obj.isoformat()
+    elif isinstance(obj, np.ndarray):
+        return _finite_or_none(obj.tolist())
+    elif isinstance(obj, np.generic):
+        value = obj.item()
+        return None if pd.isna(value) else _finite_or_none(value)
     elif pd.isna(obj):
         return None
     raise TypeError(f"Type {type(obj)} not serializable")
 
-def generate_all_stocks_metrics():
-    """Generate metrics for all stocks (called after daily stock selection)"""
+def _finite_or_none(obj: Any) -> Any:
+    """Recursively replace NaN/Infinity floats with None, matching orjson's null output
+    
+    Needed on the stdlib path: np.float64 subclasses float, so json writes a
+    bare NaN for it without ever calling the default hook.
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite_or_none(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite_or_none(value) for value in obj]
+    return obj
+
+def dump_json(data: Any, indent: bool = True) -> bytes:
+    """Serialize data to UTF-8 JSON bytes (indented or compact), using orjson when available"""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=serialize_for_json, option=option)
+    data = _finite_or_none(data)
+    if indent:
+        return json.dumps(data, ensure_ascii=False, indent=2, default=serialize_for_json).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=serialize_for_json).encode("utf-8")
+
+def load_json(path: Path) -> Any:
+    """Parse a JSON file from its raw bytes, using orjson when available"""
+    raw = path.read_bytes()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def write_json_atomic(path: Path, data: Any, indent: bool = True) -> None:
+    """Write data as JSON via a fsynced temp file, then atomically replace path"""
+    tmp_path = path.with_suffix(".json.tmp")
+    payload = memoryview(dump_json(data, indent))
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            while payload:
+                payload = payload[os.write(fd, payload):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except Exception:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+def generate_all_stocks_metrics(known_metrics: Optional[Dict[str, Dict[str, Any]]] = None):
+    """Generate metrics for all stocks (called after daily stock selection)
+    
+    known_metrics maps full tickers (e.g. "EQNR.OL") to valuation metrics that
+    were already fetched this run; those companies are not fetched again.
+    """
+    known_metrics = known_metrics or {}
     log.info(">> Starting bulk metrics generation for all stocks")
     
     oslo_companies_path = DATA_DIR / "oslo_companies_short_no.json"
-    with open(oslo_companies_path, 'r', encoding='utf-8') as f:
-        companies = json.load(f)
+    companies = load_json(oslo_companies_path)
     
     all_data = {}
     total = len(companies)
@@ -1091,39 +1247,28 @@ def generate_all_stocks_metrics():
         if i % 50 == 0:  # Progress update every 50 stocks
             log.info(f"Progress: {i}/{total} ({i/total*100:.1f}%)")
         
-        try:
-            extractor = ValuationExtractor(ticker)
-            metrics = extractor.get_comprehensive_metrics()
-            
-            all_data[base_ticker] = {
-                'sector': company.get('sector', '-'),
-                'industry': company.get('industry', '-'),
-                'revenue_2024_formatted': metrics.get('revenue_formatted', '-'),
-                'target_mean_formatted': metrics.get('target_mean_formatted', 'Ikke tilgjengelig'),
-                'target_range_formatted': metrics.get('target_range_formatted', 'Ikke tilgjengelig'),
-                'market_cap': metrics.get('market_cap'),
-                'market_cap_formatted': metrics.get('market_cap_formatted', '-'),
-            }
-            
+        metrics = known_metrics.get(normalize_ticker(ticker))
+        if metrics is None:
+            try:
+                metrics = ValuationExtractor(ticker).get_comprehensive_metrics()
+            except Exception as e:
+                log.debug(f"Failed for {ticker}: {e}")
+                metrics = {}  # Every field below falls back to its placeholder
             time.sleep(1.5)  # Rate limit protection
-            
-        except Exception as e:
-            log.debug(f"Failed for {ticker}: {e}")
-            all_data[base_ticker] = {
-                'sector': company.get('sector', '-'),
-                'industry': company.get('industry', '-'),
-                'revenue_2024_formatted': '-',
-                'target_mean_formatted': 'Ikke tilgjengelig',
-                'target_range_formatted': 'Ikke tilgjengelig',
-                'market_cap': None,
-                'market_cap_formatted': '-',
-            }
-            time.sleep(1.5)
+        
+        all_data[base_ticker] = {
+            'sector': company.get('sector', '-'),
+            'industry': company.get('industry', '-'),
+            'revenue_2024_formatted': metrics.get('revenue_formatted', '-'),
+            'target_mean_formatted': metrics.get('target_mean_formatted', 'Ikke tilgjengelig'),
+            'target_range_formatted': metrics.get('target_range_formatted', 'Ikke tilgjengelig'),
+            'market_cap': metrics.get('market_cap'),
+            'market_cap_formatted': metrics.get('market_cap_formatted', '-'),
+        }
     
     # Save to file
     output_path = DATA_DIR / "all_stocks_metrics.json"
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(all_data, f, indent=2, ensure_ascii=False)
+    write_json_atomic(output_path, all_data)
     
     log.info(f"✅ Saved metrics for {len(all_data)} stocks to {output_path}")
 
@@ -1138,8 +1283,11 @@ def main():
         # Step 0: Refresh stock list if stale (weekly)
         refresh_obx_list()
 
+        # One Oslo date for the whole run, even if it crosses midnight
+        today = get_oslo_date()
+
         # Step 1: Generate daily stock
-        selected_stock = select_daily_stock()
+        selected_stock = select_daily_stock(today)
         base_ticker = selected_stock.get("ticker") or selected_stock.get("symbol") or ""
         if not base_ticker:
             log.error("Selected stock has no ticker/symbol field")
@@ -1153,27 +1301,23 @@ def main():
         data["difficulty_rating"] = calculate_difficulty_rating(data)
         data["hint_categories"] = get_hint_categories(data)
         
-        if not check_if_data_changed(data):
+        if not check_if_data_changed(data, today):
             log.info("Data unchanged, skipping write")
             print_summary(data)
         else:
-            tmp_path = DAILY_PATH.with_suffix(".json.tmp")
             try:
-                with tmp_path.open("w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2, default=serialize_for_json)
-                tmp_path.replace(DAILY_PATH)
+                # Compact: daily.json is only read by the frontend (pretty-print with python -m json.tool)
+                write_json_atomic(DAILY_PATH, data, indent=False)
                 log.info(f"[SUCCESS] Successfully saved {DAILY_PATH}")
             except Exception as e:
                 log.error(f"Failed to write data file: {e}")
-                if tmp_path.exists():
-                    tmp_path.unlink()
                 sys.exit(1)
             
             print_summary(data)
         
         # Step 2: Generate all stocks metrics (NEW!)
         log.info("\n" + "="*60)
-        generate_all_stocks_metrics()
+        generate_all_stocks_metrics({data["ticker"]: data})
         
         log.info("[COMPLETE] Finansle data generation completed successfully!")
         